@@ -1,4 +1,5 @@
-from dataclasses import asdict
+import weakref
+from dataclasses import asdict, fields
 from datetime import datetime
 from typing import Any, Callable
 
@@ -8,6 +9,20 @@ from numpy.linalg import LinAlgError
 from . import Algorithms, Device, _GenericTensor
 from .executor import _Executor
 from .parameters import Parameters
+from .variational import _COMPUTE_DTYPES
+
+# Precomputed sets for constant-time membership checks
+_ALGORITHMS = frozenset(Algorithms)
+_DEVICES = frozenset(Device)
+
+
+def _collect_setters(cls: type) -> dict[str, Callable[..., Any]]:
+    """Map each parameter name to the setter method resolved on `cls`."""
+    return {
+        field.name: setter
+        for field in fields(Parameters)
+        if (setter := getattr(cls, f"set_{field.name}", None)) is not None
+    }
 
 
 class CaseBuilder:
@@ -100,16 +115,37 @@ class CaseBuilder:
     set_record_log(record_log: bool) -> CaseBuilder:
         Set whether to record and print log messages during execution.
 
+    set_checkpoint_every(checkpoint_every: int) -> CaseBuilder:
+        Set the interval at which background state estimates are stored
+        for optimization-based algorithms.
+
+    set_compile_loss(compile_loss: bool) -> CaseBuilder:
+        Set whether to compile the cost function for
+        optimization-based algorithms.
+
+    set_compute_dtype(compute_dtype: torch.dtype | None) -> CaseBuilder:
+        Set the data type used to evaluate the cost function for
+        optimization-based algorithms.
+
     execute() -> dict[str, torch.Tensor | dict[str, list]]:
         Execute the data assimilation case and return the results.
 
     get_results_dict() -> dict[str, torch.Tensor | dict[str, list]]:
         Get the dictionary containing the results of the executed case.
 
-    get_parameters_dict() -> dict[str, Any]:
+    get_parameters_dict(copy: bool = False) -> dict[str, Any]:
         Get the dictionary of configured parameters for the case.
+        The values are deep copied only if 'copy' is True.
     """
 
+    # Map id of each validated covariance matrix to its storage and version
+    _spd_cache: dict[int, tuple[int, int]] = {}
+
+    def __init_subclass__(cls, **kwargs) -> None:
+        super().__init_subclass__(**kwargs)
+        # Rebuild the setter table so overridden setters are dispatched to
+        cls._SETTERS = _collect_setters(cls)
+
     def __init__(
         self,
         case_name: str = None,
@@ -130,32 +166,40 @@ class CaseBuilder:
     ) -> "CaseBuilder":
         if isinstance(parameters, Parameters):
             parameters = asdict(parameters)
-        checked_builder = CaseBuilder("checker")
-        for param_name, param_value in parameters.items():
-            checked_builder.set_parameter(param_name, param_value)
-        self.__parameters = checked_builder.__parameters
+        # Validate into fresh Parameters, keep the old ones if anything fails
+        previous_parameters = self.__parameters
+        self.__parameters = Parameters()
+        try:
+            for param_name, param_value in parameters.items():
+                self.set_parameter(param_name, param_value)
+        except Exception:
+            self.__parameters = previous_parameters
+            raise
         return self
 
     def set_parameter(self, name: str, value: Any) -> "CaseBuilder":
-        if not hasattr(self.__parameters, name):
-            raise AttributeError(
-                f"Parameter '{name}' does not exist in Parameters."
-            )
-        setter_method = getattr(self, f"set_{name}", None)
+        setter_method = self._SETTERS.get(name)
         if setter_method is None:
             raise AttributeError(
-                f"Setter method for parameter '{name}' not found."
+                f"Parameter '{name}' does not exist in Parameters."
             )
-        return setter_method(value)
+        return setter_method(self, value)
 
     def set_algorithm(self, algorithm: Algorithms) -> "CaseBuilder":
-        if algorithm in Algorithms:
-            self.__parameters.algorithm = algorithm
+        if algorithm not in _ALGORITHMS:
+            raise TypeError(
+                "algorithm must be a member of Algorithms, "
+                f"given {type(algorithm)=}"
+            )
+        self.__parameters.algorithm = algorithm
         return self
 
     def set_device(self, device: Device) -> "CaseBuilder":
-        if device in Device:
-            self.__parameters.device = device
+        if device not in _DEVICES:
+            raise TypeError(
+                f"device must be a member of Device, given {type(device)=}"
+            )
+        self.__parameters.device = device
         return self
 
     def set_forward_model(
@@ -199,11 +243,16 @@ class CaseBuilder:
         )
         return self
 
-    @staticmethod
-    def check_covariance_matrix(cov_matrix: torch.Tensor) -> None:
+    @classmethod
+    def check_covariance_matrix(cls, cov_matrix: torch.Tensor) -> None:
         """
         Check if a given covariance matrix is valid.
 
+        A matrix that already passed the check is not checked again
+        unless it has been modified in place since. Writes that bypass
+        the tensor version counter, e.g. through ``.data`` or ``.numpy()``,
+        are not detected.
+
         Parameters
         ----------
         cov_matrix : torch.Tensor
@@ -213,20 +262,39 @@ class CaseBuilder:
         ------
         LinAlgError
             If the covariance matrix is not a valid square matrix,
-            not symmetric, or is singular.
+            has a non-positive diagonal, is not symmetric,
+            or is not positive definite.
         """
+        key = id(cov_matrix)
+        state = (cov_matrix.data_ptr(), cov_matrix._version)
+        if cls._spd_cache.get(key) == state:
+            return
         if cov_matrix.ndim != 2 or (
             size := cov_matrix.size(0)
         ) != cov_matrix.size(1):
             raise LinAlgError(
                 "Covariance matrix should be a 2D square matrix."
             )
-        if not torch.allclose(cov_matrix, cov_matrix.T):
+        if (cov_matrix.diagonal() <= 0).any():
+            raise LinAlgError(
+                "Covariance matrix should have a positive diagonal."
+            )
+        # Compare against the transposed view with a dtype-aware tolerance
+        tolerance = size * torch.finfo(cov_matrix.dtype).eps
+        if (cov_matrix - cov_matrix.mT).abs().amax() > (
+            tolerance * cov_matrix.abs().amax()
+        ):
             raise LinAlgError(
                 "Covariance matrix should be a symmetric matrix."
             )
-        if torch.linalg.matrix_rank(cov_matrix) != size:
-            raise LinAlgError("The input matrix is a singular matrix.")
+        # Cholesky factorization succeeds iff the matrix is positive definite
+        _, info = torch.linalg.cholesky_ex(cov_matrix)
+        if info.item() != 0:
+            raise LinAlgError("The input matrix is not positive definite.")
+        if key not in cls._spd_cache:
+            # Forget the matrix once it is freed and its id can be reused
+            weakref.finalize(cov_matrix, cls._spd_cache.pop, key, None)
+        cls._spd_cache[key] = state
 
     def set_background_covariance_matrix(
         self, background_covariance_matrix: torch.Tensor
@@ -352,6 +420,34 @@ class CaseBuilder:
         self.__parameters.record_log = record_log
         return self
 
+    def set_checkpoint_every(self, checkpoint_every: int) -> "CaseBuilder":
+        if not isinstance(checkpoint_every, int):
+            raise TypeError(
+                "checkpoint_every must be an integer, "
+                f"given {type(checkpoint_every)=}"
+            )
+        self.__parameters.checkpoint_every = checkpoint_every
+        return self
+
+    def set_compile_loss(self, compile_loss: bool) -> "CaseBuilder":
+        if not isinstance(compile_loss, bool):
+            raise TypeError(
+                f"compile_loss must be a bool, given {type(compile_loss)=}"
+            )
+        self.__parameters.compile_loss = compile_loss
+        return self
+
+    def set_compute_dtype(
+        self, compute_dtype: torch.dtype | None
+    ) -> "CaseBuilder":
+        if compute_dtype is not None and compute_dtype not in _COMPUTE_DTYPES:
+            raise TypeError(
+                "compute_dtype must be torch.float32, torch.float64 or None, "
+                f"given {compute_dtype=}"
+            )
+        self.__parameters.compute_dtype = compute_dtype
+        return self
+
     def execute(self) -> dict[str, torch.Tensor | dict[str, list]]:
         return self.__executor.set_input_parameters(self.__parameters).run()
 
@@ -388,21 +484,29 @@ class CaseBuilder:
         """
         return self.__executor.get_result(name)
 
-    def get_parameters_dict(self) -> dict[str, Any]:
-        return asdict(self.__parameters)
+    def get_parameters_dict(self, copy: bool = False) -> dict[str, Any]:
+        if copy:
+            return asdict(self.__parameters)
+        return {
+            field.name: getattr(self.__parameters, field.name)
+            for field in fields(self.__parameters)
+        }
 
     def __repr__(self) -> str:
         """
         Generate a string representation of the
         configured parameters for the case.
         """
-        params_dict = self.get_parameters_dict()
         str_list = [
             f"Parameters for Case: {self.case_name}",
             "--------------------------------------",
         ]
         str_list.extend(
             f"{param_name}:\n{param_value}\n"
-            for param_name, param_value in params_dict.items()
+            for param_name, param_value in self.get_parameters_dict().items()
         )
         return "\n".join(str_list)
+
+
+# Map each parameter name to its setter once instead of looking it up per call
+CaseBuilder._SETTERS = _collect_setters(CaseBuilder)
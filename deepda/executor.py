@@ -73,6 +73,9 @@ class _Executor:
         assert (
             self.__parameters.learning_rate > 0
         ), "`learning_rate` should be greater than 0."
+        assert (
+            self.__parameters.checkpoint_every > 0
+        ), "`checkpoint_every` should be greater than 0."
 
     def __check_4DVar_parameters(self) -> None:
         self.__check_3DVar_parameters()
@@ -136,6 +139,9 @@ class _Executor:
             self.__parameters.max_iterations,
             self.__parameters.learning_rate,
             self.__parameters.record_log,
+            self.__parameters.checkpoint_every,
+            self.__parameters.compile_loss,
+            self.__parameters.compute_dtype,
         )
 
     def __call_apply_4DVar(self) -> tuple[torch.Tensor, dict[str, list]]:
@@ -162,6 +168,9 @@ class _Executor:
             max_iterations=self.__parameters.max_iterations,
             learning_rate=self.__parameters.learning_rate,
             record_log=self.__parameters.record_log,
+            checkpoint_every=self.__parameters.checkpoint_every,
+            compile_loss=self.__parameters.compile_loss,
+            compute_dtype=self.__parameters.compute_dtype,
         )
 
     def __setup_device(self) -> None:
@@ -212,16 +221,19 @@ class _Executor:
         algorithms, particularly when the output sequence length is greater
         than 1.
 
+        A 2D input is treated as a batch of states, as in batched 4D-Var.
+        The model itself is not batched: it is called once per trajectory
+        and the results are stacked along a batch dimension after the time
+        dimension, so the cost grows linearly with the batch size.
+
         The wrapped forward model function is stored back to
         the ``forward_model`` attribute of the parameters object.
         """
         if isinstance(self.__parameters.forward_model, torch.nn.Module):
             forward_model = self.__parameters.forward_model
 
-            def forward_model_wrapper(
-                xb: torch.Tensor, time_fw: torch.Tensor, *args
-            ):
-                outs = [x0.view(1, -1) if (x0 := xb).ndim == 1 else xb]
+            def propagate(x0: torch.Tensor, time_fw: torch.Tensor, *args):
+                outs = [x0.view(1, -1)]
                 x = outs[0]
                 forward_times, residue = divmod(
                     len(time_fw[:-1]),
@@ -234,6 +246,15 @@ class _Executor:
                 outs[-1] = outs[-1][:residue]
                 return torch.cat(outs)
 
+            def forward_model_wrapper(
+                xb: torch.Tensor, time_fw: torch.Tensor, *args
+            ):
+                if xb.ndim == 1:
+                    return propagate(xb, time_fw, *args)
+                return torch.stack(
+                    [propagate(x0, time_fw, *args) for x0 in xb], dim=1
+                )
+
             self.__parameters.forward_model = forward_model_wrapper
 
     def run(self) -> dict[str, torch.Tensor | dict[str, list]]:
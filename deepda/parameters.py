@@ -77,6 +77,21 @@ class Parameters:
         Whether to record and print logs for iteration progress.
         Default is True.
 
+    checkpoint_every : int, optional
+        The interval (in iterations) at which background state estimates
+        are stored by optimization-based algorithms (3D-Var, 4D-Var).
+        Default is 1.
+
+    compile_loss : bool, optional
+        Whether to compile the cost function of optimization-based
+        algorithms (3D-Var, 4D-Var) with ``torch.compile``. Default is False.
+
+    compute_dtype : torch.dtype | None, optional
+        The data type used to evaluate the cost function of
+        optimization-based algorithms (3D-Var, 4D-Var),
+        either torch.float32 or torch.float64.
+        Default is None, which uses the data type of the background state.
+
     args : tuple, optional
         Additional arguments to pass to state transition function.
 
@@ -111,4 +126,7 @@ class Parameters:
     max_iterations: int = 1000
     learning_rate: int | float = 0.001
     record_log: bool = True
+    checkpoint_every: int = 1
+    compile_loss: bool = False
+    compute_dtype: torch.dtype | None = None
     args: tuple = ()
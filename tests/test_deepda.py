@@ -93,6 +93,9 @@ def test_parameters_attributes(parameters):
         "max_iterations",
         "learning_rate",
         "record_log",
+        "checkpoint_every",
+        "compile_loss",
+        "compute_dtype",
         "args",
     ):
         assert hasattr(parameters, key)
@@ -117,6 +120,11 @@ def test_case_set_algorithm(case, algorithms):
     assert case.set_parameter("algorithm", algorithms.EnKF)
     assert case.set_parameter("algorithm", algorithms.Var3D)
     assert case.set_parameter("algorithm", algorithms.Var4D)
+    try:
+        case.set_parameter("algorithm", "Var3D")
+        assert False, "algorithm must be a member of Algorithms."
+    except TypeError:
+        assert True
 
 
 def test_case_set_device(case, devices):
@@ -124,6 +132,11 @@ def test_case_set_device(case, devices):
     assert case.set_device(devices.GPU)
     assert case.set_parameter("device", devices.CPU)
     assert case.set_parameter("device", devices.GPU)
+    try:
+        case.set_parameter("device", None)
+        assert False, "device must be a member of Device."
+    except TypeError:
+        assert True
 
 
 def test_case_set_forward_model(case):
@@ -168,6 +181,19 @@ def test_case_check_covariance_matrix(deepda, case, dummy_tensor):
         assert False
 
 
+def test_case_check_modified_covariance_matrix(deepda, torch):
+    from numpy.linalg import LinAlgError
+
+    cov_matrix = torch.eye(3)
+    deepda.CaseBuilder.check_covariance_matrix(cov_matrix)
+    cov_matrix[0, 0] = -1.0
+    try:
+        deepda.CaseBuilder.check_covariance_matrix(cov_matrix)
+        assert False, "A modified covariance matrix must be checked again."
+    except LinAlgError:
+        assert True
+
+
 def test_case_set_background_covariance_matrix(case, dummy_tensor):
     assert case.set_background_covariance_matrix(dummy_tensor)
     assert case.set_parameter("background_covariance_matrix", dummy_tensor)
@@ -318,8 +344,49 @@ def test_case_set_record_log(case):
         assert True
 
 
+def test_case_set_checkpoint_every(case):
+    assert case.set_checkpoint_every(1)
+    assert case.set_parameter("checkpoint_every", 10)
+    try:
+        case.set_parameter("checkpoint_every", "1")
+        assert False, "checkpoint_every must be an integer."
+    except TypeError:
+        assert True
+
+
+def test_case_set_compile_loss(case):
+    assert case.set_compile_loss(True)
+    assert case.set_compile_loss(False)
+    assert case.set_parameter("compile_loss", True)
+    assert case.set_parameter("compile_loss", False)
+    try:
+        case.set_parameter("compile_loss", None)
+        assert False, "compile_loss must be a bool."
+    except TypeError:
+        assert True
+
+
+def test_case_set_compute_dtype(case, torch):
+    assert case.set_compute_dtype(torch.float32)
+    assert case.set_compute_dtype(None)
+    assert case.set_parameter("compute_dtype", torch.float64)
+    assert case.set_parameter("compute_dtype", None)
+    try:
+        case.set_parameter("compute_dtype", "float32")
+        assert False, "compute_dtype must be a torch.dtype or None."
+    except TypeError:
+        assert True
+    for dtype in (torch.bfloat16, torch.float16, torch.int64):
+        try:
+            case.set_parameter("compute_dtype", dtype)
+            assert False, "compute_dtype must be float32, float64 or None."
+        except TypeError:
+            assert True
+
+
 def test_case_get_parameters_dict(case):
     assert case.get_parameters_dict()
+    assert case.get_parameters_dict(copy=True)
 
 
 def test_executor_get_results_dict(executor):
@@ -338,3 +405,255 @@ def test_executor_get_result(executor):
         assert False, "`nonexistent_attr` is not a key in results dictionary."
     except KeyError:
         assert True
+
+
+def test_apply_3DVar_not_positive_definite(deepda, torch):
+    from numpy.linalg import LinAlgError
+
+    try:
+        deepda.apply_3DVar(
+            lambda x: x,
+            torch.diag(torch.tensor([1.0, -1.0, 1.0])),
+            torch.eye(3),
+            torch.zeros(3),
+            torch.ones(3),
+            max_iterations=1,
+            record_log=False,
+        )
+        assert False, "An indefinite `B` must be rejected."
+    except LinAlgError:
+        assert True
+
+
+def test_loss_3DVar_matches_per_row_loop(torch):
+    from deepda.variational import _loss_3DVar
+
+    generator = torch.Generator().manual_seed(0)
+    A = torch.randn(3, 3, generator=generator, dtype=torch.float64)
+    B = A @ A.T + 3.0 * torch.eye(3, dtype=torch.float64)
+    R = torch.diag(torch.tensor([0.5, 2.0], dtype=torch.float64))
+    h = torch.randn(2, 3, generator=generator, dtype=torch.float64)
+    x0, xb = torch.randn(2, 4, 3, generator=generator, dtype=torch.float64)
+    y = torch.randn(4, 2, generator=generator, dtype=torch.float64)
+
+    loss = _loss_3DVar(
+        lambda x: x @ h.T,
+        torch.linalg.cholesky(B),
+        torch.linalg.cholesky(R),
+        x0,
+        xb,
+        y,
+    )
+    reference = sum(
+        (x0[i] - xb[i]) @ torch.linalg.solve(B, x0[i] - xb[i])
+        + (y[i] - h @ x0[i]) @ torch.linalg.solve(R, y[i] - h @ x0[i])
+        for i in range(4)
+    )
+    assert torch.allclose(loss, reference)
+
+
+def test_apply_4DVar_cost_split(deepda, torch):
+    generator = torch.Generator().manual_seed(0)
+    m = 0.9 * torch.eye(3, dtype=torch.float64)
+    h = torch.randn(2, 3, generator=generator, dtype=torch.float64)
+    R = torch.diag(torch.tensor([0.5, 2.0], dtype=torch.float64))
+    xb = torch.randn(3, generator=generator, dtype=torch.float64)
+    y = torch.randn(3, 2, generator=generator, dtype=torch.float64)
+
+    def M(x, time_fw):
+        states = [x]
+        for _ in time_fw[1:]:
+            states.append(states[-1] @ m.T)
+        return torch.stack(states)
+
+    _, intermediate_results = deepda.apply_4DVar(
+        [0.0, 1.0, 2.0],
+        [2, 2],
+        M,
+        lambda x: x @ h.T,
+        torch.eye(3, dtype=torch.float64),
+        R,
+        xb,
+        y,
+        max_iterations=1,
+        record_log=False,
+    )
+    x, reference_Jo = xb, 0.0
+    for iobs in range(3):
+        if iobs > 0:
+            x = M(x, torch.linspace(0.0, 1.0, 3))[-1]
+        residual = y[iobs] - h @ x
+        reference_Jo += float(residual @ torch.linalg.solve(R, residual))
+    # Jb is the background term only, which is zero at x0 = xb,
+    # and the observation at t0 is part of Jo
+    assert intermediate_results["Jb"][0] == 0.0
+    assert abs(intermediate_results["Jo"][0] - reference_Jo) < 1e-9
+    assert intermediate_results["J"][0] == intermediate_results["Jo"][0]
+
+
+def test_apply_3DVar_checkpoint_every(deepda, torch):
+    _, intermediate_results = deepda.apply_3DVar(
+        lambda x: x,
+        torch.eye(3),
+        torch.eye(3),
+        torch.zeros(3),
+        torch.ones(3),
+        max_iterations=5,
+        record_log=False,
+        checkpoint_every=2,
+    )
+    assert intermediate_results["background_states"].shape == (3, 3)
+    try:
+        deepda.apply_3DVar(
+            lambda x: x,
+            torch.eye(3),
+            torch.eye(3),
+            torch.zeros(3),
+            torch.ones(3),
+            record_log=False,
+            checkpoint_every=0,
+        )
+        assert False, "checkpoint_every must be positive."
+    except ValueError:
+        assert True
+
+
+def test_case_subclass_setter_override(deepda):
+    class LoggingCaseBuilder(deepda.CaseBuilder):
+        def set_max_iterations(self, max_iterations):
+            self.overridden = True
+            return super().set_max_iterations(max_iterations)
+
+    case = LoggingCaseBuilder()
+    assert case.set_parameter("max_iterations", 10)
+    assert case.overridden
+
+
+def test_apply_3DVar_compute_dtype(deepda, torch):
+    xb = torch.zeros(3, dtype=torch.float64)
+    x_optimal, intermediate_results = deepda.apply_3DVar(
+        lambda x: x,
+        torch.eye(3, dtype=torch.float64),
+        torch.eye(3, dtype=torch.float64),
+        xb,
+        torch.ones(3, dtype=torch.float64),
+        max_iterations=10,
+        record_log=False,
+        compute_dtype=torch.float32,
+    )
+    assert x_optimal.dtype == xb.dtype
+    assert intermediate_results["J"][-1] < intermediate_results["J"][0]
+    try:
+        deepda.apply_3DVar(
+            lambda x: x,
+            torch.eye(3),
+            torch.eye(3),
+            torch.zeros(3),
+            torch.ones(3),
+            record_log=False,
+            compute_dtype=torch.bfloat16,
+        )
+        assert False, "bfloat16 is not supported by the triangular solve."
+    except TypeError:
+        assert True
+
+
+def test_case_batched_4DVar_matches_single_runs(deepda, torch):
+    class LinearStep(torch.nn.Module):
+        def __init__(self):
+            super().__init__()
+            self.weight = torch.nn.Parameter(
+                0.9 * torch.eye(3, dtype=torch.float64)
+            )
+
+        def forward(self, x):
+            return (x @ self.weight.T).view(1, -1)
+
+    forward_model = LinearStep()
+
+    def run(background_state, observations):
+        parameters = {
+            "algorithm": deepda.Algorithms.Var4D,
+            "forward_model": forward_model,
+            "observation_model": lambda x: x,
+            "background_covariance_matrix": torch.eye(
+                3, dtype=torch.float64
+            ),
+            "observation_covariance_matrix": torch.eye(
+                3, dtype=torch.float64
+            ),
+            "background_state": background_state,
+            "observations": observations,
+            "observation_time_steps": [0.0, 1.0, 2.0],
+            "gaps": [2, 2],
+            "max_iterations": 5,
+            "learning_rate": 0.1,
+            "record_log": False,
+        }
+        results = deepda.CaseBuilder(parameters=parameters).execute()
+        return results["assimilated_background_state"]
+
+    generator = torch.Generator().manual_seed(0)
+    xb = torch.randn(2, 3, generator=generator, dtype=torch.float64)
+    y = torch.randn(3, 2, 3, generator=generator, dtype=torch.float64)
+    x0 = run(xb, y)
+    assert x0.shape == xb.shape
+    for b in range(2):
+        assert torch.allclose(x0[b], run(xb[b], y[:, b]))
+
+
+def test_case_set_parameters_copies_objects(deepda, torch):
+    forward_model = torch.nn.Linear(3, 3)
+    gaps = [1, 2]
+    case = deepda.CaseBuilder().set_parameters(
+        deepda.Parameters(
+            algorithm=deepda.Algorithms.Var4D,
+            observation_model=lambda x: x,
+            background_covariance_matrix=torch.eye(3),
+            observation_covariance_matrix=torch.eye(3),
+            background_state=torch.zeros(3),
+            observations=torch.ones(3, 3),
+            forward_model=forward_model,
+            gaps=gaps,
+        )
+    )
+    parameters_dict = case.get_parameters_dict()
+    assert parameters_dict["forward_model"] is not forward_model
+    assert parameters_dict["gaps"] is not gaps
+
+
+def test_apply_3DVar_column_wise_H(deepda, torch):
+    h = torch.ones(2, 3)
+    try:
+        deepda.apply_3DVar(
+            lambda x: h @ x.T,
+            torch.eye(3),
+            torch.eye(2),
+            torch.zeros(3, 3),
+            torch.ones(3, 2),
+            max_iterations=1,
+            record_log=False,
+        )
+        assert False, "`H` must return the observations row-wise."
+    except ValueError:
+        assert True
+
+
+def test_apply_4DVar_column_wise_H(deepda, torch):
+    h = torch.ones(2, 3)
+    try:
+        deepda.apply_4DVar(
+            [0.0, 1.0, 2.0],
+            [2, 2],
+            lambda x, time_fw: x.expand(len(time_fw), *x.shape),
+            lambda x: h @ x.T,
+            torch.eye(3),
+            torch.eye(2),
+            torch.zeros(3),
+            torch.ones(3, 2),
+            max_iterations=1,
+            record_log=False,
+        )
+        assert False, "`H` must return the observations row-wise."
+    except ValueError:
+        assert True